@@ -1,45 +1,71 @@
 import sys
 import time
 import re
+import difflib
 import threading
 import queue
+import random
+import tracemalloc
+import weakref
+import json
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import minescript
 from minescript import echo, execute, player_look_at, player_press_use
 from minescript import player_press_attack, player_inventory, player_inventory_select_slot
-from minescript import entities, getblock, screen_name, flush
+from minescript import entities, getblock, screen_name, flush, player_position
 from minescript import EventQueue, EventType
 
 exit_requested = False
+open_event_queues = 0
 KEY_ESCAPE = 256
 
 
 def _exit_listener_thread_fn():
-    global exit_requested
+    global exit_requested, open_event_queues
     try:
         with EventQueue() as event_queue:
-            event_queue.register_key_listener()
-            while not exit_requested:
-                try:
-                    event = event_queue.get(block=True, timeout=0.5)
-                except queue.Empty:
-                    continue
-                if getattr(event, "type", None) == EventType.KEY and getattr(event, "key", None) == KEY_ESCAPE:
-                    exit_requested = True
-                    break
+            open_event_queues += 1
+            try:
+                event_queue.register_key_listener()
+                while not exit_requested:
+                    try:
+                        event = event_queue.get(block=True, timeout=0.5)
+                    except queue.Empty:
+                        continue
+                    if getattr(event, "type", None) == EventType.KEY and getattr(event, "key", None) == KEY_ESCAPE:
+                        update_status(stop_reason="escape")
+                        exit_requested = True
+                        break
+            finally:
+                open_event_queues -= 1
     except Exception:
         pass
 
 
 STEP = 0
+_step_buffer = threading.local()
+
+def _buffered(fn, *args):
+    lines = getattr(_step_buffer, "lines", None)
+    if lines is None:
+        return False
+    lines.append((fn, args))
+    return True
 
 def step_ok(desc):
     global STEP
+    if _buffered(step_ok, desc):
+        return
     STEP += 1
     echo(f"  Step {STEP} - {desc} - OK")
 
 def step_fail(desc, detail=""):
     global STEP
+    if _buffered(step_fail, desc, detail):
+        return
     STEP += 1
     msg = f"  Step {STEP} - {desc} - FAIL"
     if detail:
@@ -47,9 +73,171 @@ def step_fail(desc, detail=""):
     echo(msg)
 
 def step_info(desc):
+    if _buffered(step_info, desc):
+        return
     echo(f"  [INFO] {desc}")
 
 
+TICK_SECONDS = 0.05
+world_info = getattr(minescript, "world_info", None)
+
+
+class TickScheduler:
+    def __init__(self, backend):
+        self.backend = backend
+        self._aim = None
+        self._slot = None
+        self._pending = False
+
+    def invalidate(self):
+        self._aim = None
+        self._slot = None
+
+    def current_tick(self):
+        try:
+            return self.backend.game_ticks()
+        except Exception:
+            return None
+
+    def look_at(self, x, y, z):
+        target = (round(float(x), 3), round(float(y), 3), round(float(z), 3))
+        if target == self._aim:
+            return
+        self.backend.look_at(*target)
+        self._aim = target
+        self._pending = True
+
+    def select_slot(self, slot):
+        if slot == self._slot:
+            return
+        self.backend.select_slot(slot)
+        self._slot = slot
+        self._pending = True
+
+    def press_use(self, down):
+        self.backend.press_use(down)
+        self._pending = True
+
+    def press_attack(self, down):
+        self.backend.press_attack(down)
+        self._pending = True
+
+    def commit(self):
+        if self._pending:
+            self.backend.flush()
+            self._pending = False
+
+    def wait_ticks(self, n=1):
+        self.commit()
+        start = self.current_tick()
+        if start is None:
+            self.backend.sleep(n * TICK_SECONDS)
+            return
+        end = self.backend.time() + n * TICK_SECONDS * 4
+        while self.backend.time() < end:
+            self.backend.sleep(TICK_SECONDS / 5)
+            now = self.current_tick()
+            if now is None or now - start >= n:
+                return
+
+
+class LiveBackend:
+    def __init__(self):
+        self.scheduler = TickScheduler(self)
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def game_ticks(self):
+        if world_info is None:
+            return None
+        return int(world_info().game_ticks)
+
+    def getblock(self, x, y, z):
+        return getblock(x, y, z)
+
+    def screen_name(self):
+        return screen_name()
+
+    def flush(self):
+        flush()
+
+    def look_at(self, x, y, z):
+        player_look_at(x, y, z)
+
+    def press_use(self, down):
+        player_press_use(down)
+
+    def press_attack(self, down):
+        player_press_attack(down)
+
+    def inventory(self):
+        return player_inventory()
+
+    def select_slot(self, slot):
+        player_inventory_select_slot(slot)
+
+    def execute(self, command):
+        execute(command)
+
+    def entities(self, **kwargs):
+        return entities(**kwargs)
+
+    def villagers_fallback(self):
+        return _find_villagers_java()
+
+    def is_merchant_screen(self):
+        return _is_merchant_screen_java()
+
+    def trade_offers(self):
+        return get_trade_offers_via_java()
+
+    def trader_xp(self):
+        return get_trader_xp_via_java()
+
+    def enchants(self, item_handle):
+        return get_enchants_from_item(item_handle)
+
+    def close_screen(self):
+        return close_trade_screen()
+
+
+LIVE = LiveBackend()
+
+
+_JAVA_CLASSES = {}
+JAVA_WARM_CLASSES = (
+    "net.minecraft.client.Minecraft",
+    "net.minecraft.core.component.DataComponents",
+    "net.minecraft.world.entity.npc.Villager",
+    "net.minecraft.world.phys.AABB",
+    "net.minecraft.core.registries.Registries",
+    "net.minecraft.tags.EnchantmentTags",
+)
+
+
+def _java_class(name):
+    cls = _JAVA_CLASSES.get(name)
+    if cls is None:
+        from java import JavaClass
+        cls = _JAVA_CLASSES[name] = JavaClass(name)
+    return cls
+
+
+def warm_java_classes():
+    resolved = 0
+    for name in JAVA_WARM_CLASSES:
+        try:
+            _java_class(name)
+            resolved += 1
+        except Exception:
+            continue
+    return resolved
+
+
 _ROMAN = {"i": 1, "v": 5, "x": 10, "l": 50, "c": 100, "d": 500, "m": 1000}
 
 def _parse_roman(s):
@@ -80,7 +268,7 @@ def normalize_enchant(name):
             min_level = int(level_str)
         else:
             min_level = _parse_roman(level_str)
-        if min_level is not None and 1 <= min_level <= 10:
+        if min_level is not None:
             name = enchant_part
         else:
             min_level = None
@@ -96,18 +284,196 @@ def normalize_enchant(name):
     return name, min_level
 
 
+_ENCHANT_TABLE = {
+    "minecraft:aqua_affinity": (1, True),
+    "minecraft:bane_of_arthropods": (5, True),
+    "minecraft:binding_curse": (1, True),
+    "minecraft:blast_protection": (4, True),
+    "minecraft:breach": (4, True),
+    "minecraft:channeling": (1, True),
+    "minecraft:density": (5, True),
+    "minecraft:depth_strider": (3, True),
+    "minecraft:efficiency": (5, True),
+    "minecraft:feather_falling": (4, True),
+    "minecraft:fire_aspect": (2, True),
+    "minecraft:fire_protection": (4, True),
+    "minecraft:flame": (1, True),
+    "minecraft:fortune": (3, True),
+    "minecraft:frost_walker": (2, True),
+    "minecraft:impaling": (5, True),
+    "minecraft:infinity": (1, True),
+    "minecraft:knockback": (2, True),
+    "minecraft:looting": (3, True),
+    "minecraft:loyalty": (3, True),
+    "minecraft:luck_of_the_sea": (3, True),
+    "minecraft:lunge": (3, True),
+    "minecraft:lure": (3, True),
+    "minecraft:mending": (1, True),
+    "minecraft:multishot": (1, True),
+    "minecraft:piercing": (4, True),
+    "minecraft:power": (5, True),
+    "minecraft:projectile_protection": (4, True),
+    "minecraft:protection": (4, True),
+    "minecraft:punch": (2, True),
+    "minecraft:quick_charge": (3, True),
+    "minecraft:respiration": (3, True),
+    "minecraft:riptide": (3, True),
+    "minecraft:sharpness": (5, True),
+    "minecraft:silk_touch": (1, True),
+    "minecraft:smite": (5, True),
+    "minecraft:soul_speed": (3, False),
+    "minecraft:sweeping_edge": (3, True),
+    "minecraft:swift_sneak": (3, False),
+    "minecraft:thorns": (3, True),
+    "minecraft:unbreaking": (3, True),
+    "minecraft:vanishing_curse": (1, True),
+    "minecraft:wind_burst": (3, False),
+}
+
+_ENCHANT_ALIASES = {
+    "prot": "protection",
+    "fire_prot": "fire_protection",
+    "blast_prot": "blast_protection",
+    "proj_prot": "projectile_protection",
+    "projectile_prot": "projectile_protection",
+    "feather": "feather_falling",
+    "unb": "unbreaking",
+    "unbreak": "unbreaking",
+    "eff": "efficiency",
+    "fort": "fortune",
+    "silk": "silk_touch",
+    "loot": "looting",
+    "sharp": "sharpness",
+    "bane": "bane_of_arthropods",
+    "sweeping": "sweeping_edge",
+    "sweep": "sweeping_edge",
+    "luck": "luck_of_the_sea",
+    "depth": "depth_strider",
+    "frost": "frost_walker",
+    "resp": "respiration",
+    "aqua": "aqua_affinity",
+    "inf": "infinity",
+    "quick": "quick_charge",
+    "multi": "multishot",
+    "mend": "mending",
+    "binding": "binding_curse",
+    "curse_of_binding": "binding_curse",
+    "vanishing": "vanishing_curse",
+    "curse_of_vanishing": "vanishing_curse",
+}
+
+
+def _enchant_entries_from_registry():
+    try:
+        Minecraft = _java_class("net.minecraft.client.Minecraft")
+        mc = Minecraft.getInstance()
+        level = mc.level if mc is not None else None
+        if level is None:
+            return {}
+        Registries = _java_class("net.minecraft.core.registries.Registries")
+        access = level.registryAccess()
+        registry = None
+        for method_name in ("lookupOrThrow", "registryOrThrow"):
+            try:
+                registry = getattr(access, method_name)(Registries.ENCHANTMENT)
+                break
+            except Exception:
+                continue
+        if registry is None:
+            return {}
+        tradeable_tag = None
+        try:
+            tradeable_tag = _java_class("net.minecraft.tags.EnchantmentTags").TRADEABLE
+        except Exception:
+            pass
+        out = {}
+        it = registry.listElements().iterator()
+        while it.hasNext():
+            holder = it.next()
+            eid = _enchant_id_from_key(holder)
+            if not eid:
+                continue
+            fallback_max, fallback_tradeable = _ENCHANT_TABLE.get(eid, (None, True))
+            try:
+                max_level = int(holder.value().getMaxLevel())
+            except Exception:
+                max_level = fallback_max
+            if max_level is None:
+                continue
+            tradeable = fallback_tradeable
+            if tradeable_tag is not None:
+                try:
+                    tradeable = bool(getattr(holder, "is")(tradeable_tag))
+                except Exception:
+                    pass
+            out[eid] = (max_level, tradeable)
+        return out
+    except Exception as e:
+        step_info(f"Enchantment registry unavailable: {e}")
+        return {}
+
+
+class EnchantIndex:
+    __slots__ = ("entries", "source", "_by_path")
+
+    def __init__(self, entries, source):
+        self.entries = entries
+        self.source = source
+        self._by_path = {eid.split(":", 1)[1]: eid for eid in entries}
+
+    @classmethod
+    def build(cls):
+        entries = _enchant_entries_from_registry()
+        if entries:
+            return cls(entries, "registry")
+        return cls(dict(_ENCHANT_TABLE), "bundled table")
+
+    def resolve(self, name):
+        key = re.sub(r"[\s\-]+", "_", (name or "").strip().lower())
+        if not key:
+            return None, None
+        ns, _, path = key.rpartition(":")
+        path = _ENCHANT_ALIASES.get(path, path)
+        eid = f"{ns or 'minecraft'}:{path}"
+        if eid in self.entries:
+            return eid, None
+        if (ns and ns != "minecraft") or re.search(r"\d", path):
+            return None, None
+        close = difflib.get_close_matches(path, list(self._by_path) + list(_ENCHANT_ALIASES), n=1, cutoff=0.8)
+        if close:
+            fuzzy = self._by_path.get(_ENCHANT_ALIASES.get(close[0], close[0]))
+            if fuzzy:
+                return fuzzy, path
+        return None, None
+
+    def suggest(self, name, n=3):
+        path = re.sub(r"[\s\-]+", "_", (name or "").strip().lower()).rpartition(":")[2]
+        return difflib.get_close_matches(path, list(self._by_path), n=n, cutoff=0.5)
+
+    def validate(self, eid, min_level=None):
+        max_level, tradeable = self.entries[eid]
+        short = eid.replace("minecraft:", "")
+        if not tradeable:
+            return f"librarians never offer {short}"
+        if min_level is not None and min_level < 1:
+            return f"enchantment levels start at 1, not {min_level}"
+        if min_level is not None and min_level > max_level:
+            return f"{short} only goes up to level {max_level}"
+        return None
+
+
 class _VillagerLike:
-    __slots__ = ("position", "type", "nbt")
+    __slots__ = ("position", "type", "nbt", "__weakref__")
     def __init__(self, position, type_="villager", nbt=None):
         self.position = position
         self.type = type_
         self.nbt = nbt or ""
+        track_handle(self)
 
 
 def _find_villagers_java(librarians_only=True):
     try:
-        from java import JavaClass
-        Minecraft = JavaClass("net.minecraft.client.Minecraft")
+        Minecraft = _java_class("net.minecraft.client.Minecraft")
         mc = Minecraft.getInstance()
         if mc is None or mc.player is None:
             return []
@@ -120,7 +486,7 @@ def _find_villagers_java(librarians_only=True):
         px, py, pz = player.getX(), player.getY(), player.getZ()
         r = 32.0
         try:
-            AABB = JavaClass("net.minecraft.world.phys.AABB")
+            AABB = _java_class("net.minecraft.world.phys.AABB")
             box = AABB(px - r, py - r, pz - r, px + r, py + r, pz + r)
         except Exception:
             return []
@@ -130,7 +496,7 @@ def _find_villagers_java(librarians_only=True):
             "net.minecraft.entity.passive.VillagerEntity",
         ):
             try:
-                villager_class = JavaClass(name)
+                villager_class = _java_class(name)
                 break
             except Exception:
                 continue
@@ -203,15 +569,19 @@ def _find_villagers_java(librarians_only=True):
         return []
 
 
-def find_closest_librarian():
+def _dist_sq(a, b):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+def find_villagers(limit=15, backend=LIVE):
     step_info("Finding nearby villagers...")
     all_villagers = []
     for type_pattern in (".*villager.*", "villager", "minecraft:villager"):
         try:
-            all_villagers = entities(
+            all_villagers = backend.entities(
                 type=type_pattern,
                 sort="nearest",
-                limit=15,
+                limit=limit,
                 nbt=True,
                 max_distance=64,
             )
@@ -222,7 +592,7 @@ def find_closest_librarian():
             continue
     if not all_villagers:
         try:
-            nearby = entities(sort="nearest", limit=50, max_distance=64, nbt=True)
+            nearby = backend.entities(sort="nearest", limit=max(50, limit * 3), max_distance=64, nbt=True)
             for e in nearby or []:
                 t = getattr(e, "type", None) or ""
                 if "villager" in str(t).lower():
@@ -231,16 +601,36 @@ def find_closest_librarian():
             step_info(f"Fallback entity search: {e}")
     if not all_villagers:
         step_info("Trying Java client-world villager search...")
-        all_villagers = _find_villagers_java()
+        all_villagers = backend.villagers_fallback()
+    return all_villagers or []
+
+
+def _is_librarian(villager):
+    nbt = getattr(villager, "nbt", None) or ""
+    if isinstance(nbt, dict):
+        nbt = str(nbt)
+    return "librarian" in (nbt or "").lower()
+
+
+def find_closest_librarian(near=None, exclude=None, backend=LIVE):
+    all_villagers = find_villagers(backend=backend)
     if not all_villagers:
         step_fail("Finding villagers", "no villagers in range (try standing closer)")
         return None
     step_ok("Found villager(s)")
+    if exclude is not None:
+        ex = _pos_xyz(exclude)
+        remaining = [v for v in all_villagers if ex is None or _dist_sq(_pos_xyz(v.position), ex) > 1.0]
+        if not remaining:
+            step_fail("Switching villager", "no other villager in range")
+            return None
+        all_villagers = remaining
+    if near is not None:
+        target = _pos_xyz(near)
+        if target is not None:
+            all_villagers = sorted(all_villagers, key=lambda v: _dist_sq(_pos_xyz(v.position), target))
     for v in all_villagers:
-        nbt = getattr(v, "nbt", None) or ""
-        if isinstance(nbt, dict):
-            nbt = str(nbt)
-        if "librarian" in (nbt or "").lower():
+        if _is_librarian(v):
             step_info(f"Selected librarian at {v.position}")
             return v
     v = all_villagers[0]
@@ -248,7 +638,7 @@ def find_closest_librarian():
     return v
 
 
-def open_trade_with_villager(librarian):
+def open_trade_with_villager(librarian, backend=LIVE):
     if not librarian:
         return False
     p = _pos_xyz(getattr(librarian, "position", None))
@@ -259,34 +649,29 @@ def open_trade_with_villager(librarian):
     look_y = float(py) + 1.0
     step_info(f"Looking at villager center at ({px}, {look_y}, {pz})")
     try:
-        player_look_at(float(px), look_y, float(pz))
+        backend.scheduler.look_at(px, look_y, pz)
     except Exception as e:
         step_fail("Looking at villager", str(e))
         return False
-    flush()
-    time.sleep(0.05)
     try:
-        player_press_use(True)
+        backend.scheduler.press_use(True)
     except Exception as e:
         step_fail("Press use (open trade)", str(e))
         return False
-    flush()
-    time.sleep(0.05)
+    backend.scheduler.wait_ticks(1)
     try:
-        player_press_use(False)
+        backend.scheduler.press_use(False)
     except Exception:
         pass
-    flush()
-    time.sleep(0.1)
+    backend.scheduler.commit()
     return True
 
 
 def _is_merchant_screen_java():
     try:
-        from java import JavaClass
         for mc_name in ("net.minecraft.client.Minecraft", "net.minecraft.class_310"):
             try:
-                Minecraft = JavaClass(mc_name)
+                Minecraft = _java_class(mc_name)
                 mc = Minecraft.getInstance()
                 if mc is None:
                     return False, ""
@@ -309,26 +694,26 @@ def _is_merchant_screen_java():
         return False, str(e)
 
 
-def wait_for_merchant_screen(timeout_sec=5.0):
+def wait_for_merchant_screen(timeout_sec=5.0, backend=LIVE):
     step_info("Waiting for trade screen...")
     try:
-        initial_name = screen_name()
+        initial_name = backend.screen_name()
     except Exception:
         initial_name = None
     had_screen_at_start = bool(initial_name and str(initial_name).strip())
-    start = time.time()
+    start = backend.time()
     last_log = 0.0
-    while time.time() - start < timeout_sec:
+    while backend.time() - start < timeout_sec:
         try:
-            name = screen_name()
+            name = backend.screen_name()
         except Exception:
             name = None
-        elapsed = time.time() - start
+        elapsed = backend.time() - start
         has_screen = bool(name and str(name).strip())
         if name and ("merchant" in name.lower() or "trade" in name.lower() or "villager" in name.lower()):
             step_ok("Trade screen open")
             return True
-        is_merchant, cls_name = _is_merchant_screen_java()
+        is_merchant, cls_name = backend.is_merchant_screen()
         if is_merchant:
             step_ok("Trade screen open (Java check)")
             return True
@@ -343,12 +728,12 @@ def wait_for_merchant_screen(timeout_sec=5.0):
             last_log = elapsed
         if exit_requested:
             return False
-        time.sleep(0.05)
+        backend.sleep(0.05)
     try:
-        name = screen_name()
+        name = backend.screen_name()
     except Exception:
         name = None
-    _, cls_name = _is_merchant_screen_java()
+    _, cls_name = backend.is_merchant_screen()
     step_fail("Trade screen did not open", f"timeout (screen_name={name!r}, class={cls_name})")
     return False
 
@@ -400,25 +785,52 @@ def _get_current_screen_java(mc):
     return None
 
 
+def _get_merchant_menu_java():
+    for mc_name in ("net.minecraft.client.Minecraft", "net.minecraft.class_310"):
+        try:
+            Minecraft = _java_class(mc_name)
+            break
+        except Exception:
+            continue
+    else:
+        step_info("Could not load Minecraft class")
+        return None
+    mc = Minecraft.getInstance()
+    if mc is None:
+        return None
+    screen = _get_current_screen_java(mc)
+    if screen is None:
+        return None
+    return track_handle(screen.getMenu()) if hasattr(screen, "getMenu") else None
+
+
+def get_trader_xp_via_java():
+    try:
+        menu = _get_merchant_menu_java()
+        if menu is None or not hasattr(menu, "getTraderXp"):
+            return None
+        return int(menu.getTraderXp())
+    except Exception as e:
+        step_info(f"Java trader xp failed: {e}")
+        return None
+
+
+def _offer_cost(offer):
+    for method_name in ("getCostA", "getBaseCostA"):
+        try:
+            fn = getattr(offer, method_name, None)
+            if fn is not None:
+                cost = fn()
+                if cost is not None and not cost.isEmpty():
+                    return (_item_name(cost), int(cost.getCount()))
+        except Exception:
+            continue
+    return None
+
+
 def get_trade_offers_via_java():
     try:
-        from java import JavaClass
-        for mc_name in ("net.minecraft.client.Minecraft", "net.minecraft.class_310"):
-            try:
-                Minecraft = JavaClass(mc_name)
-                break
-            except Exception:
-                continue
-        else:
-            step_info("Could not load Minecraft class")
-            return []
-        mc = Minecraft.getInstance()
-        if mc is None:
-            return []
-        screen = _get_current_screen_java(mc)
-        if screen is None:
-            return []
-        menu = screen.getMenu() if hasattr(screen, "getMenu") else None
+        menu = _get_merchant_menu_java()
         if menu is None:
             return []
         offers = None
@@ -437,7 +849,7 @@ def get_trade_offers_via_java():
                 continue
             result = offer.getResult() if hasattr(offer, "getResult") else None
             if result is not None and not result.isEmpty():
-                out.append((i, result))
+                out.append((i, track_handle(result), _offer_cost(offer)))
         return out
     except Exception as e:
         step_info(f"Java trade offers failed: {e}")
@@ -476,13 +888,12 @@ def _enchant_id_from_key(key):
 def get_enchants_from_item(item_handle):
     out = []
     try:
-        from java import JavaClass
         for class_name in (
             "net.minecraft.core.component.DataComponents",
             "net.minecraft.component.DataComponentTypes",
         ):
             try:
-                comp_type_class = JavaClass(class_name)
+                comp_type_class = _java_class(class_name)
             except Exception:
                 continue
 
@@ -549,38 +960,76 @@ def get_enchants_from_item(item_handle):
     return out
 
 
-def item_has_enchantment(item_handle, want_enchant_id, min_level=None):
-    for eid, lvl in get_enchants_from_item(item_handle):
-        if want_enchant_id in eid or want_enchant_id.replace("minecraft:", "") in eid:
-            if min_level is None or lvl >= min_level:
-                return True
-    return False
+def match_targets(enchants, targets):
+    for eid, lvl in enchants:
+        if eid not in targets:
+            continue
+        min_level = targets[eid]
+        if min_level is None or lvl >= min_level:
+            return eid
+    return None
 
 
-def check_trades_for_enchant(want_enchant_id, min_level=None):
-    offers = get_trade_offers_via_java()
+def format_targets(targets):
+    return ", ".join(
+        eid.replace("minecraft:", "") + (f" Lv>={lvl}" if lvl is not None else "")
+        for eid, lvl in targets.items()
+    )
+
+
+def _item_name(item_handle):
+    try:
+        return item_handle.getItem().getDescriptionId().replace("item.minecraft.", "")
+    except Exception:
+        return "?"
+
+
+def decode_offers(offers, backend=LIVE):
+    decoded = []
+    for idx, result_item, cost in offers or []:
+        try:
+            count = int(result_item.getCount())
+        except Exception:
+            count = 1
+        decoded.append((idx, _item_name(result_item), count, tuple(backend.enchants(result_item)), cost))
+    return decoded
+
+
+def offer_fingerprint(decoded):
+    if not any(name == "enchanted_book" for _, name, _, _, _ in decoded):
+        return None
+    return f"{zlib.crc32(repr(decoded).encode('utf-8')):08x}"
+
+
+def check_trades_for_enchant(targets, backend=LIVE):
+    offers = backend.trade_offers()
     if offers is None:
-        return False, "could not get offers (Java)"
+        return False, "could not get offers (Java)", None
     if not offers:
-        return False, "no trade offers"
-    level_str = f" Lv>={min_level}" if min_level is not None else ""
-    want_short = want_enchant_id.replace("minecraft:", "")
-    for idx, result_item in offers:
-        enchants = get_enchants_from_item(result_item)
+        update_status(last_offers=[])
+        return False, "no trade offers", None
+    wants = format_targets(targets)
+    seen = []
+    decoded = decode_offers(offers, backend)
+    for idx, _, _, enchants, _ in decoded:
         has_str = ", ".join(f"{e.replace('minecraft:','')} Lv{l}" for e, l in enchants) if enchants else "none"
-        echo(f"  WANTS: {want_short}{level_str}  |  HAS: {has_str}")
-        if item_has_enchantment(result_item, want_enchant_id, min_level):
+        seen.append(f"#{idx}: {has_str}")
+        echo(f"  WANTS: {wants}  |  HAS: {has_str}")
+        matched = match_targets(enchants, targets)
+        if matched:
+            update_status(last_offers=seen)
             step_ok(f"MATCH found in trade #{idx}")
-            return True, f"trade #{idx}"
-    return False, "not in offers"
+            return True, matched, None
+    fingerprint = offer_fingerprint(decoded)
+    update_status(last_offers=seen, fingerprint=fingerprint)
+    return False, "not in offers", fingerprint
 
 
 def close_trade_screen():
     step_info("Closing trade screen...")
     for mc_name in ("net.minecraft.client.Minecraft", "net.minecraft.class_310"):
         try:
-            from java import JavaClass
-            Minecraft = JavaClass(mc_name)
+            Minecraft = _java_class(mc_name)
             mc = Minecraft.getInstance()
             if mc is not None:
                 mc.setScreen(None)
@@ -601,7 +1050,7 @@ def _pos_xyz(position):
     return None
 
 
-def find_lectern_near(position, radius=3):
+def find_lectern_near(position, radius=3, backend=LIVE):
     p = _pos_xyz(position)
     if p is None:
         return None
@@ -614,7 +1063,7 @@ def find_lectern_near(position, radius=3):
     )
     for _, x, y, z in candidates:
         try:
-            block = getblock(x, y, z)
+            block = backend.getblock(x, y, z)
             if block and "lectern" in block.lower():
                 return (x, y, z)
         except Exception:
@@ -622,10 +1071,10 @@ def find_lectern_near(position, radius=3):
     return None
 
 
-def find_best_axe_slot():
+def find_best_axe_slot(backend=LIVE):
     priority = ["netherite", "diamond", "iron", "stone", "golden", "wooden"]
     try:
-        inv = player_inventory()
+        inv = backend.inventory()
     except Exception:
         return None
     best_slot = None
@@ -645,14 +1094,15 @@ def find_best_axe_slot():
     return best_slot
 
 
-def break_lectern(pos):
+def break_lectern(pos, axe_slot=None, backend=LIVE):
     x, y, z = pos
 
-    axe_slot = find_best_axe_slot()
+    if axe_slot is None:
+        axe_slot = find_best_axe_slot(backend)
     if axe_slot is None:
         step_info("No axe in hotbar, falling back to /setblock (lectern won't drop)")
         try:
-            execute(f"/setblock {x} {y} {z} air")
+            backend.execute(f"/setblock {x} {y} {z} air")
             step_ok(f"Broke lectern at ({x}, {y}, {z}) via setblock")
             return True
         except Exception as e:
@@ -660,48 +1110,40 @@ def break_lectern(pos):
             return False
 
     try:
-        player_inventory_select_slot(axe_slot)
+        backend.scheduler.select_slot(axe_slot)
     except Exception as e:
         step_fail("Select axe slot", str(e))
         return False
-    flush()
-    time.sleep(0.05)
 
     try:
-        player_look_at(x + 0.5, y + 0.5, z + 0.5)
+        backend.scheduler.look_at(x + 0.5, y + 0.5, z + 0.5)
     except Exception as e:
         step_fail("Look at lectern", str(e))
         return False
-    flush()
-    time.sleep(0.1)
 
     step_info(f"Breaking lectern at ({x},{y},{z}) with axe slot {axe_slot}...")
     try:
-        player_press_attack(True)
-        flush()
-        deadline = time.time() + 5.0
-        while time.time() < deadline:
-            time.sleep(0.1)
+        backend.scheduler.press_attack(True)
+        for _ in range(BREAK_TIMEOUT_TICKS):
+            if exit_requested:
+                break
+            backend.scheduler.wait_ticks(1)
             try:
-                block = getblock(x, y, z)
+                block = backend.getblock(x, y, z)
                 if not block or "lectern" not in block.lower():
                     break
             except Exception:
                 break
-        player_press_attack(False)
-        flush()
     except Exception as e:
-        try:
-            player_press_attack(False)
-        except Exception:
-            pass
         step_fail("Break lectern (attack)", str(e))
         return False
+    finally:
+        release_inputs(backend)
 
     try:
-        block = getblock(x, y, z)
+        block = backend.getblock(x, y, z)
         if block and "lectern" in block.lower():
-            step_fail("Break lectern", "block still there after 5s")
+            step_fail("Break lectern", f"block still there after {BREAK_TIMEOUT_TICKS} ticks")
             return False
     except Exception:
         pass
@@ -710,6 +1152,25 @@ def break_lectern(pos):
     return True
 
 
+def is_lectern_at(pos, backend=LIVE):
+    try:
+        block = backend.getblock(*pos)
+    except Exception:
+        return False
+    return bool(block) and "lectern" in block.lower()
+
+
+def wait_for_lectern(pos, ticks=20, backend=LIVE):
+    for _ in range(ticks):
+        if is_lectern_at(pos, backend):
+            return True
+        backend.scheduler.wait_ticks(1)
+    if is_lectern_at(pos, backend):
+        return True
+    step_fail("Verify lectern", f"no lectern at {pos}")
+    return False
+
+
 def _block_pos_xyz(position):
     p = _pos_xyz(position)
     if p is None:
@@ -717,10 +1178,10 @@ def _block_pos_xyz(position):
     return int(p[0]), int(p[1]), int(p[2])
 
 
-def _is_solid_place_target(x, y, z):
+def _is_solid_place_target(x, y, z, backend=LIVE):
     try:
-        at = getblock(x, y, z)
-        below = getblock(x, y - 1, z)
+        at = backend.getblock(x, y, z)
+        below = backend.getblock(x, y - 1, z)
     except Exception:
         return False
     at = (at or "").lower()
@@ -734,7 +1195,7 @@ def _is_solid_place_target(x, y, z):
     return True
 
 
-def pick_lectern_place_pos(lectern_pos, villager_position):
+def pick_lectern_place_pos(lectern_pos, villager_position, backend=LIVE):
     vp = _block_pos_xyz(villager_position)
     if vp is None:
         return lectern_pos
@@ -748,7 +1209,7 @@ def pick_lectern_place_pos(lectern_pos, villager_position):
     for cx, cy, cz in candidates:
         if (cx, cy, cz) == (vx, vy, vz) or (cx, cy, cz) == (vx, vy + 1, vz):
             continue
-        if not _is_solid_place_target(cx, cy, cz):
+        if not _is_solid_place_target(cx, cy, cz, backend):
             continue
         if (cx, cy, cz) != lectern_pos:
             step_info(f"Placing lectern at ({cx},{cy},{cz}) (villager at {vp})")
@@ -757,9 +1218,9 @@ def pick_lectern_place_pos(lectern_pos, villager_position):
     return lectern_pos
 
 
-def find_lectern_slot_in_hotbar():
+def find_lectern_slot_in_hotbar(backend=LIVE):
     try:
-        inv = player_inventory()
+        inv = backend.inventory()
     except Exception as e:
         step_fail("Get inventory", str(e))
         return None
@@ -777,47 +1238,42 @@ def find_lectern_slot_in_hotbar():
     return None
 
 
-def place_lectern_at(pos):
-    slot = find_lectern_slot_in_hotbar()
+def place_lectern_at(pos, slot=None, backend=LIVE):
+    if slot is None:
+        slot = find_lectern_slot_in_hotbar(backend)
     if slot is None:
         return False
     try:
-        player_inventory_select_slot(slot)
+        backend.scheduler.select_slot(slot)
     except Exception as e:
         step_fail("Select lectern slot", str(e))
         return False
-    flush()
-    time.sleep(0.1)
     x, y, z = pos
     try:
-        player_look_at(x + 0.5, y, z + 0.5)
+        backend.scheduler.look_at(x + 0.5, y, z + 0.5)
     except Exception:
         pass
-    flush()
-    time.sleep(0.05)
     try:
-        player_press_use(True)
+        backend.scheduler.press_use(True)
     except Exception as e:
         step_fail("Place lectern (use)", str(e))
         return False
-    flush()
-    time.sleep(0.05)
+    backend.scheduler.wait_ticks(1)
     try:
-        player_press_use(False)
+        backend.scheduler.press_use(False)
     except Exception:
         pass
-    flush()
+    backend.scheduler.commit()
     step_ok("Placed lectern")
     return True
 
 
-def wait_for_villager_relink(librarian=None, timeout=2.0):
-    step_info("Waiting 2s for villager to claim lectern...")
-    end = time.time() + timeout
-    while time.time() < end:
+def wait_for_villager_relink(librarian=None, ticks=40, backend=LIVE):
+    step_info(f"Waiting {ticks} ticks for villager to claim lectern...")
+    for _ in range(0, ticks, 2):
         if exit_requested:
             return
-        time.sleep(0.1)
+        backend.scheduler.wait_ticks(2)
     step_ok("Wait complete")
 
 
@@ -832,12 +1288,7 @@ def run_list_mode():
         echo("No offers found on this screen.")
         return
     echo(f"Found {len(offers)} trade(s):")
-    for idx, result_item in offers:
-        try:
-            item_name = result_item.getItem().getDescriptionId().replace("item.minecraft.", "")
-        except Exception:
-            item_name = "?"
-        enchants = get_enchants_from_item(result_item)
+    for idx, item_name, _, enchants, _ in decode_offers(offers):
         if enchants:
             parts = [f"{eid.replace('minecraft:','')} Lv{lv}" for eid, lv in enchants]
             echo(f"  Trade {idx}: {item_name} -> {', '.join(parts)}")
@@ -846,9 +1297,390 @@ def run_list_mode():
     echo("Done.")
 
 
+SURVEY_REACH = 3.0
+SURVEY_LIMIT = 64
+
+
+def _format_survey_offer(item_name, count, enchants):
+    text = item_name if count == 1 else f"{count}x {item_name}"
+    if enchants:
+        text += " (" + ", ".join(f"{eid.replace('minecraft:','')} {lv}" for eid, lv in enchants) + ")"
+    return text
+
+
+def survey_villager(villager, backend=LIVE):
+    if not open_trade_with_villager(villager, backend) or not wait_for_merchant_screen(timeout_sec=1.5, backend=backend):
+        return None, None
+    decoded = decode_offers(backend.trade_offers(), backend)
+    trader_xp = backend.trader_xp()
+    backend.close_screen()
+    backend.scheduler.wait_ticks(1)
+    return decoded, trader_xp
+
+
+def run_survey_mode():
+    echo("=== Survey mode: reading every librarian in reach ===")
+    set_stage("survey")
+    try:
+        eye = _pos_xyz(player_position())
+    except Exception as e:
+        step_fail("Get player position", str(e))
+        return
+    if eye is None:
+        step_fail("Get player position", "invalid position")
+        return
+    eye = (eye[0], eye[1] + 1.62, eye[2])
+    librarians = [v for v in find_villagers(limit=SURVEY_LIMIT) if _is_librarian(v) or not getattr(v, "nbt", None)]
+    if not librarians:
+        echo("No librarians found.")
+        return
+    in_reach = []
+    far = []
+    for v in librarians:
+        p = _pos_xyz(v.position)
+        if p is not None and _dist_sq((p[0], p[1] + 1.0, p[2]), eye) <= SURVEY_REACH ** 2:
+            in_reach.append(v)
+        else:
+            far.append(v)
+    step_ok(f"{len(in_reach)} librarian(s) in reach, {len(far)} out of reach")
+
+    close_stray_screen()
+    started = time.time()
+    rows = []
+    seen = {}
+    for n, v in enumerate(in_reach, 1):
+        if exit_requested:
+            echo(stop_message())
+            break
+        update_status(attempt=n, villager=v.position)
+        decoded, trader_xp = survey_villager(v)
+        if decoded is None:
+            rows.append((n, v, "could not open trade", None))
+            release_inputs()
+            close_stray_screen()
+            continue
+        note = None
+        fingerprint = offer_fingerprint(decoded)
+        if fingerprint is not None and fingerprint in seen:
+            note = f"same offers as #{seen[fingerprint]} (another villager may be in the way)"
+        if fingerprint is not None:
+            seen.setdefault(fingerprint, n)
+        if trader_xp:
+            note = (note + "; " if note else "") + "locked (traded with)"
+        offers_text = "; ".join(_format_survey_offer(name, count, ench) for _, name, count, ench, _ in decoded) or "no offers"
+        rows.append((n, v, offers_text, note))
+    release_inputs()
+    LIVE.scheduler.invalidate()
+
+    echo(f"=== Survey: {len(rows)} librarian(s) in {time.time() - started:.1f}s ===")
+    for n, v, offers_text, note in rows:
+        x, y, z = (int(c) for c in _pos_xyz(v.position))
+        line = f"  #{n} ({x}, {y}, {z}): {offers_text}"
+        if note:
+            line += f"  [{note}]"
+        echo(line)
+    for v in far:
+        x, y, z = (int(c) for c in _pos_xyz(v.position))
+        echo(f"  - ({x}, {y}, {z}): out of reach, skipped")
+    update_status(survey=[[list(_pos_xyz(v.position)), text, note] for _, v, text, note in rows])
+    set_stage("done")
+
+
+_STATUS_LOCK = threading.Lock()
+_STATUS = {
+    "stage": "idle",
+    "attempt": 0,
+    "paused": False,
+    "auto_paused": False,
+    "targets": [],
+    "villager": None,
+    "lectern": None,
+    "last_offers": [],
+    "stage_timings": {},
+    "stop_reason": None,
+}
+_stage_started = None
+control_commands = queue.Queue()
+CONTROL_COMMANDS = ("set_target", "add_target", "remove_target", "pause", "resume", "switch_villager", "stop")
+DEFAULT_CONTROL_PORT = 8765
+
+
+_HANDLES = {}
+untracked_handles = 0
+
+
+def track_handle(obj):
+    global untracked_handles
+    if obj is None:
+        return obj
+    try:
+        _HANDLES.setdefault(_STATUS["stage"], weakref.WeakSet()).add(obj)
+    except TypeError:
+        untracked_handles += 1
+    return obj
+
+
+def live_handle_counts():
+    return {stage: len(refs) for stage, refs in list(_HANDLES.items())}
+
+
+def update_status(**fields):
+    with _STATUS_LOCK:
+        _STATUS.update(fields)
+
+
+def set_stage(stage):
+    global _stage_started
+    now = time.time()
+    with _STATUS_LOCK:
+        prev = _STATUS["stage"]
+        if _stage_started is not None:
+            spent = now - _stage_started
+            t = _STATUS["stage_timings"].setdefault(prev, {"last": 0.0, "total": 0.0, "count": 0})
+            t["last"] = round(spent, 3)
+            t["total"] = round(t["total"] + spent, 3)
+            t["count"] += 1
+        _STATUS["stage"] = stage
+        _stage_started = now
+
+
+def status_snapshot():
+    with _STATUS_LOCK:
+        snap = json.loads(json.dumps(_STATUS, default=str))
+        if _stage_started is not None:
+            snap["stage_elapsed"] = round(time.time() - _stage_started, 3)
+    return snap
+
+
+class _ControlHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("", "/status"):
+            self._reply(200, status_snapshot())
+        else:
+            self._reply(404, {"error": "unknown path"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/command":
+            self._reply(404, {"error": "unknown path"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            cmd = json.loads(self.rfile.read(length) or b"{}")
+        except Exception as e:
+            self._reply(400, {"error": f"bad request: {e}"})
+            return
+        name = cmd.get("command") if isinstance(cmd, dict) else None
+        if name not in CONTROL_COMMANDS:
+            self._reply(400, {"error": f"command must be one of {', '.join(CONTROL_COMMANDS)}"})
+            return
+        if name in ("set_target", "add_target", "remove_target"):
+            if not isinstance(cmd.get("target"), str):
+                self._reply(400, {"error": "target must be a string such as \"unbreaking 3\""})
+                return
+            eid, min_level = normalize_enchant(cmd["target"])
+            eid, _ = self.server.index.resolve(eid) if eid else (None, None)
+            if not eid:
+                self._reply(400, {"error": f"unknown enchantment: {cmd.get('target')!r}"})
+                return
+            problem = self.server.index.validate(eid, min_level)
+            if problem and name != "remove_target":
+                self._reply(400, {"error": f"impossible target: {problem}"})
+                return
+            cmd["target"] = [eid, min_level]
+        if name == "switch_villager" and cmd.get("position") is not None:
+            position = cmd["position"]
+            if not (
+                isinstance(position, list)
+                and len(position) == 3
+                and all(isinstance(c, (int, float)) and not isinstance(c, bool) for c in position)
+            ):
+                self._reply(400, {"error": "position must be [x, y, z]"})
+                return
+        control_commands.put(cmd)
+        self._reply(202, {"queued": name})
+
+
+def start_control_server(port, index):
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _ControlHandler)
+    except Exception as e:
+        step_fail("Start control server", str(e))
+        return None
+    server.daemon_threads = True
+    server.index = index
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    step_ok(f"Control server on http://127.0.0.1:{port}")
+    return server
+
+
+def apply_control_commands(targets):
+    global exit_requested
+    switch = None
+    while True:
+        try:
+            cmd = control_commands.get_nowait()
+        except queue.Empty:
+            break
+        name = cmd["command"]
+        if name in ("set_target", "add_target", "remove_target"):
+            eid, min_level = cmd["target"]
+            if name == "set_target":
+                targets.clear()
+            if name == "remove_target":
+                targets.pop(eid, None)
+            else:
+                targets[eid] = min_level
+            step_info(f"Control: targets now {format_targets(targets) or '(none)'}")
+            if targets and _STATUS["auto_paused"]:
+                update_status(paused=False, auto_paused=False)
+                step_info("Control: target added, resuming")
+        elif name == "pause":
+            update_status(paused=True, auto_paused=False)
+            step_info("Control: paused")
+        elif name == "resume":
+            update_status(paused=False, auto_paused=False)
+            step_info("Control: resumed")
+        elif name == "switch_villager":
+            switch = cmd.get("position") or True
+            step_info("Control: switching villager")
+        elif name == "stop":
+            update_status(stop_reason="control")
+            exit_requested = True
+    update_status(targets=[[eid, lvl] for eid, lvl in targets.items()])
+    return switch
+
+
+STAGE_DEADLINES = {
+    "discover": 15.0,
+    "open": 8.0,
+    "read": 5.0,
+    "close": 3.0,
+    "find_lectern": 5.0,
+    "break": 8.0,
+    "place": 5.0,
+    "relink": 10.0,
+}
+DEFAULT_RETRY_BUDGET = 5
+RELINK_TICKS = 40
+BREAK_TIMEOUT_TICKS = 100
+MAX_FINGERPRINT_REPEATS = 3
+
+
+def release_inputs(backend=LIVE):
+    for press in (backend.press_attack, backend.press_use):
+        try:
+            press(False)
+        except Exception:
+            pass
+    try:
+        backend.flush()
+    except Exception:
+        pass
+
+
+def close_stray_screen(backend=LIVE):
+    try:
+        name = backend.screen_name()
+    except Exception:
+        name = None
+    if name and str(name).strip():
+        backend.close_screen()
+
+
+class Watchdog:
+    def __init__(self, budget=DEFAULT_RETRY_BUDGET, backend=LIVE):
+        self.budget = budget
+        self.backend = backend
+        self.failures = 0
+        self.recoveries = 0
+        self.stalls = 0
+        self._stop = threading.Event()
+        self._flagged = None
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not exit_requested and not self._stop.is_set():
+            with _STATUS_LOCK:
+                stage = _STATUS["stage"]
+                started = _stage_started
+            deadline = STAGE_DEADLINES.get(stage)
+            if deadline and started is not None and time.time() - started > deadline:
+                if self._flagged != (stage, started):
+                    self._flagged = (stage, started)
+                    self.stalls += 1
+                    update_status(stalls=self.stalls)
+                    step_info(f"Watchdog: stage '{stage}' stalled past {deadline:.0f}s, releasing inputs")
+                    release_inputs(self.backend)
+            self._stop.wait(0.25)
+
+    def succeeded(self):
+        self.failures = 0
+
+    def recover(self, stage, reason):
+        if exit_requested:
+            return False
+        self.failures += 1
+        if self.failures > self.budget:
+            step_fail("Watchdog", f"giving up after {self.budget} retries ({stage}: {reason})")
+            return False
+        self.recoveries += 1
+        update_status(recoveries=self.recoveries)
+        step_info(f"Recovering from {stage} failure ({reason}), retry {self.failures}/{self.budget}")
+        set_stage("recover")
+        self.backend.scheduler.invalidate()
+        release_inputs(self.backend)
+        close_stray_screen(self.backend)
+        end = self.backend.time() + min(0.5 * 2 ** (self.failures - 1), 8.0)
+        while self.backend.time() < end:
+            if exit_requested:
+                return False
+            self.backend.sleep(0.1)
+        set_stage(stage)
+        return True
+
+
+def _parse_int_flag(args, flag, default):
+    rest = []
+    value = None
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == flag:
+            value = default
+            if i + 1 < len(args) and args[i + 1].isdigit():
+                value = int(args[i + 1])
+                i += 1
+        elif a.startswith(flag + "="):
+            try:
+                value = int(a.split("=", 1)[1])
+            except ValueError:
+                value = default
+        else:
+            rest.append(a)
+        i += 1
+    return value, rest
+
+
 def main():
     global STEP, exit_requested
     exit_requested = False
+    update_status(stop_reason=None)
     listener = threading.Thread(target=_exit_listener_thread_fn, daemon=True)
     listener.start()
 
@@ -860,86 +1692,583 @@ def main():
     if any(a == "--list" for a in args):
         run_list_mode()
         return
+    if any(a == "--survey" for a in args):
+        run_survey_mode()
+        return
+    control_port, args = _parse_int_flag(args, "--control", DEFAULT_CONTROL_PORT)
+    retry_budget, args = _parse_int_flag(args, "--retries", DEFAULT_RETRY_BUDGET)
+    soak_backend, args = _parse_soak(args)
+    soak_every, args = _parse_int_flag(args, "--sample-every", SOAK_SAMPLE_EVERY)
+    soak_cycles, args = _parse_int_flag(args, "--cycles", 0)
+    if soak_backend:
+        want = " ".join(a for a in args if a).strip() or None
+        run_soak_mode(
+            soak_backend,
+            want,
+            soak_every or SOAK_SAMPLE_EVERY,
+            soak_cycles or 0,
+            DEFAULT_RETRY_BUDGET if retry_budget is None else retry_budget,
+        )
+        return
 
     want = " ".join(a for a in args if a and a != "--list").strip() or None
     want_enchant_id, want_min_level = normalize_enchant(want)
     if not want_enchant_id:
         echo("Usage: \\librarian_enchant_cycle ENCHANT_NAME [LEVEL]")
         echo("       \\librarian_enchant_cycle --list   (list enchants on open trade)")
+        echo("       \\librarian_enchant_cycle --survey   (read every librarian in reach, no lecterns broken)")
+        echo("       \\librarian_enchant_cycle ENCHANT --control [PORT]   (local control/status server)")
+        echo("       \\librarian_enchant_cycle ENCHANT --retries N   (recoveries before giving up)")
+        echo("       \\librarian_enchant_cycle --soak [live|sim] [--cycles N] [--sample-every N]   (leak soak test)")
         echo("Examples: \\librarian_enchant_cycle mending")
         echo("          \\librarian_enchant_cycle Sharpness 5   or   Sharpness V")
         return
 
+    warmup = start_warmup(want_enchant_id, want_min_level)
+    index = warmup.result("enchant index") or EnchantIndex(dict(_ENCHANT_TABLE), "bundled table")
+    step_info(f"Enchantment index: {len(index.entries)} entries from {index.source}")
+    want_enchant_id, errors = warmup.result("target", (None, ["Could not validate target."]))
+    if not want_enchant_id:
+        warmup.shutdown()
+        for line in errors:
+            echo(line)
+        return
+
+    targets = {want_enchant_id: want_min_level}
     echo("=== Librarian Enchant Cycle Bot ===")
     echo(f"Target enchant: {want_enchant_id}" + (f" (level >= {want_min_level})" if want_min_level else ""))
     echo("Press Escape to stop.")
     STEP = 0
 
+    server = start_control_server(control_port, index) if control_port else None
+    watchdog = Watchdog(DEFAULT_RETRY_BUDGET if retry_budget is None else retry_budget)
+    watchdog.start()
+    try:
+        run_cycle_loop(targets, watchdog, warmup)
+    finally:
+        warmup.shutdown()
+        watchdog.stop()
+        release_inputs()
+        set_stage("stopped")
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+class Warmup:
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(max_workers=6)
+        self._futures = {}
+        self._replayed = set()
+        self._started = time.time()
+        self.latency = {}
+
+    def submit(self, name, fn, *args):
+        def timed():
+            _step_buffer.lines = []
+            t0 = time.time()
+            try:
+                return fn(*args), _step_buffer.lines
+            finally:
+                self.latency[name] = round(time.time() - t0, 3)
+                _step_buffer.lines = None
+
+        fut = self._pool.submit(timed)
+        fut.add_done_callback(lambda _: update_status(warmup=dict(self.latency)))
+        self._futures[name] = fut
+
+    def _value(self, name, default=None):
+        fut = self._futures.get(name)
+        if fut is None:
+            return default
+        try:
+            value = fut.result()[0]
+        except Exception:
+            return default
+        return default if value is None else value
+
+    def result(self, name, default=None):
+        fut = self._futures.get(name)
+        if fut is None:
+            return default
+        try:
+            value, lines = fut.result()
+        except Exception as e:
+            step_info(f"Warm-up {name} failed: {e}")
+            return default
+        if name not in self._replayed:
+            self._replayed.add(name)
+            for fn, args in lines:
+                fn(*args)
+            step_info(f"Warm-up: {name} ready in {self.latency.get(name, 0) * 1000:.0f}ms")
+        return default if value is None else value
+
+    def take(self, name, default=None):
+        value = self.result(name, default)
+        self._futures.pop(name, None)
+        return value
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def resolve_target(index, typed, min_level):
+    eid, fuzzy_from = index.resolve(typed)
+    if not eid:
+        lines = [f"Unknown enchantment: {typed.replace('minecraft:', '')}"]
+        hint = index.suggest(typed)
+        if hint:
+            lines.append(f"Did you mean: {', '.join(hint)}?")
+        return None, lines
+    if fuzzy_from:
+        step_info(f"Interpreting '{fuzzy_from}' as {eid}")
+    problem = index.validate(eid, min_level)
+    if problem:
+        return None, [f"Impossible target: {problem}."]
+    return eid, []
+
+
+def start_warmup(typed, min_level):
+    warmup = Warmup()
+    warmup.submit("enchant index", EnchantIndex.build)
+    warmup.submit("target", lambda: resolve_target(warmup._value("enchant index"), typed, min_level))
+    warmup.submit("java classes", warm_java_classes)
+    warmup.submit("villager", find_closest_librarian)
+    warmup.submit("lectern", lambda: find_lectern_near(getattr(warmup._value("villager"), "position", None)))
+    warmup.submit("axe slot", find_best_axe_slot)
+    warmup.submit("lectern slot", find_lectern_slot_in_hotbar)
+    return warmup
+
+
+def stop_message():
+    if _STATUS["stop_reason"] == "control":
+        return "Stopped by control command."
+    return "Stopped by user (Escape)."
+
+
+def _abort(reason):
+    if exit_requested:
+        echo(stop_message())
+    else:
+        update_status(stop_reason=reason)
+        echo(f"Aborting: {reason}")
+
+
+def run_cycle_loop(targets, watchdog, warmup=None, stop_on_match=True, on_cycle=None, backend=LIVE):
     attempt = 0
-    cached_librarian = None
+    cached_librarian = warmup.take("villager") if warmup else None
+    warmup_librarian = cached_librarian
     cached_lectern_pos = None
+    anchor_pos = None
+    if cached_librarian is not None:
+        update_status(villager=cached_librarian.position)
+    last_fingerprint = None
+    repeats = 0
+    stalls = 0
+    relink_ticks = RELINK_TICKS
+    update_status(targets=[[eid, lvl] for eid, lvl in targets.items()], repeats=0, reroll_stalls=0)
 
     while True:
+        switch = apply_control_commands(targets)
+        if switch is not None:
+            near = switch if switch is not True else None
+            exclude = getattr(cached_librarian, "position", None) if near is None else None
+            cached_librarian = find_closest_librarian(near=near, exclude=exclude, backend=backend) or cached_librarian
+            cached_lectern_pos = None
+            backend.scheduler.invalidate()
+            last_fingerprint = None
+            update_status(villager=getattr(cached_librarian, "position", None), lectern=None)
+        if not targets and stop_on_match and not _STATUS["paused"]:
+            step_info("No targets left; pausing until one is added")
+            update_status(paused=True, auto_paused=True)
+        if _STATUS["paused"]:
+            if _STATUS["stage"] != "paused":
+                set_stage("paused")
+                backend.scheduler.invalidate()
+            if exit_requested:
+                echo(stop_message())
+                return
+            backend.sleep(0.2)
+            continue
         if exit_requested:
-            echo("Stopped by user (Escape).")
+            echo(stop_message())
             return
         attempt += 1
+        update_status(attempt=attempt)
         echo(f"--- Attempt {attempt} ---")
 
         if cached_librarian is None:
-            cached_librarian = find_closest_librarian()
+            set_stage("discover")
+            cached_librarian = find_closest_librarian(near=anchor_pos, backend=backend)
             if not cached_librarian:
-                echo("Aborting: no librarian found.")
+                if watchdog.recover("discover", "no librarian found"):
+                    continue
+                _abort("no librarian found.")
                 return
+            cached_lectern_pos = None
+            last_fingerprint = None
+            update_status(villager=cached_librarian.position, lectern=None)
         librarian = cached_librarian
 
-        if not open_trade_with_villager(librarian):
-            step_fail("Open trade", "could not interact")
-            return
-        flush()
-        if not wait_for_merchant_screen():
-            step_fail("Open trade", "screen did not open")
-            return
+        set_stage("open")
+        opened = open_trade_with_villager(librarian, backend) and wait_for_merchant_screen(backend=backend)
+        if not opened:
+            if not watchdog.recover("open", "trade screen did not open"):
+                _abort("could not open trade.")
+                return
+            if cached_lectern_pos is not None and not is_lectern_at(cached_lectern_pos, backend):
+                step_info(f"Lectern missing at {cached_lectern_pos}, replacing it")
+                place_lectern_at(cached_lectern_pos, backend=backend)
+            anchor_pos = librarian.position
+            cached_librarian = None
+            continue
 
-        found, detail = check_trades_for_enchant(want_enchant_id, want_min_level)
-        if found:
-            msg = f"SUCCESS: Enchant '{want_enchant_id}'"
-            if want_min_level is not None:
-                msg += f" (level>={want_min_level})"
+        set_stage("read")
+        trader_xp = backend.trader_xp()
+        if trader_xp:
+            step_fail("Villager locked", f"it has been traded with ({trader_xp} xp), its trades can never change")
+            backend.close_screen()
+            _abort("villager trades are locked.")
+            return
+        found, detail, fingerprint = check_trades_for_enchant(targets, backend)
+        if found and not stop_on_match:
+            step_info(f"Soak: {detail} matched, cycling on")
+        elif found:
+            min_level = targets[detail]
+            msg = f"SUCCESS: Enchant '{detail}'"
+            if min_level is not None:
+                msg += f" (level>={min_level})"
             msg += " is in the trade list. Done."
             echo(msg)
+            update_status(found=detail)
             return
-
-        if not close_trade_screen():
-            step_fail("Close trade", "could not close")
-            return
-        flush()
+        if fingerprint is not None and fingerprint == last_fingerprint:
+            repeats += 1
+            update_status(repeats=repeats)
+            if repeats >= MAX_FINGERPRINT_REPEATS:
+                step_fail("Re-roll check", f"offers unchanged for {repeats + 1} cycles")
+                if stop_on_match:
+                    backend.close_screen()
+                    _abort("villager is not re-rolling (locked, or not linked to this lectern).")
+                    return
+                stalls += 1
+                repeats = 0
+                relink_ticks = RELINK_TICKS
+                update_status(repeats=repeats, reroll_stalls=stalls)
+                step_info(f"Soak: re-roll stall #{stalls} counted, cycling on")
+            else:
+                relink_ticks = min(relink_ticks * 2, RELINK_TICKS * 4)
+                step_info(f"Offers unchanged ({fingerprint}); re-scanning lectern, relink wait {relink_ticks} ticks")
+            cached_lectern_pos = None
+        else:
+            repeats = 0
+            relink_ticks = RELINK_TICKS
+        last_fingerprint = fingerprint
+
+        set_stage("close")
+        if not backend.close_screen():
+            if not watchdog.recover("close", "could not close trade screen"):
+                _abort("could not close trade.")
+                return
 
         if cached_lectern_pos is None:
-            cached_lectern_pos = find_lectern_near(getattr(librarian, "position", None))
+            set_stage("find_lectern")
+            if warmup and librarian is warmup_librarian and attempt == 1:
+                cached_lectern_pos = warmup.take("lectern")
+            if cached_lectern_pos is None:
+                cached_lectern_pos = find_lectern_near(getattr(librarian, "position", None), backend=backend)
             if not cached_lectern_pos:
-                step_fail("Find lectern", "no lectern near villager")
-                return
+                if not watchdog.recover("find_lectern", "no lectern near villager"):
+                    _abort("no lectern near villager.")
+                    return
+                anchor_pos = librarian.position
+                cached_librarian = None
+                continue
         lectern_pos = cached_lectern_pos
 
-        if not break_lectern(lectern_pos):
-            return
-        flush()
+        set_stage("break")
+        axe_slot = warmup.take("axe slot") if warmup else None
+        while not break_lectern(lectern_pos, axe_slot, backend):
+            axe_slot = None
+            if not is_lectern_at(lectern_pos, backend):
+                step_info("Lectern is gone after all, continuing")
+                break
+            if not watchdog.recover("break", "lectern still standing"):
+                _abort("could not break lectern.")
+                return
 
-        place_pos = pick_lectern_place_pos(lectern_pos, getattr(librarian, "position", None))
+        set_stage("place")
+        place_pos = pick_lectern_place_pos(lectern_pos, getattr(librarian, "position", None), backend)
         if place_pos is None:
             place_pos = lectern_pos
-        if not place_lectern_at(place_pos):
-            echo("Aborting: could not place lectern.")
-            return
+        lectern_slot = warmup.take("lectern slot") if warmup else None
+        while not place_lectern_at(place_pos, lectern_slot, backend) or not wait_for_lectern(place_pos, backend=backend):
+            lectern_slot = None
+            if not watchdog.recover("place", "lectern not placed"):
+                _abort("could not place lectern.")
+                return
         cached_lectern_pos = place_pos
-        flush()
+        update_status(lectern=place_pos)
 
-        wait_for_villager_relink()
+        set_stage("relink")
+        wait_for_villager_relink(ticks=relink_ticks, backend=backend)
         if exit_requested:
-            echo("Stopped by user (Escape).")
+            echo(stop_message())
+            return
+        watchdog.succeeded()
+        if on_cycle is not None and not on_cycle(attempt):
             return
 
 
+class _SimItem:
+    def __init__(self, name, count=1, enchants=(), cost=None):
+        self.name = name
+        self.count = count
+        self.enchants = list(enchants)
+        self.cost = cost
+
+    def getItem(self):
+        return self
+
+    def getDescriptionId(self):
+        return f"item.minecraft.{self.name}"
+
+    def getCount(self):
+        return self.count
+
+    def isEmpty(self):
+        return False
+
+
+class _SimStack:
+    def __init__(self, slot, item):
+        self.slot = slot
+        self.item = item
+
+
+class SimBackend:
+    VILLAGER = (0.5, 64.0, 2.5)
+    LECTERN = (1, 64, 2)
+    AXE_SLOT = 0
+    LECTERN_SLOT = 1
+
+    def __init__(self, seed=0, reroll_chance=0.98):
+        self.rng = random.Random(seed)
+        self.reroll_chance = reroll_chance
+        self.lectern = self.LECTERN
+        self.screen = None
+        self.slot = 0
+        self.aim = None
+        self.now = 0.0
+        self.scheduler = TickScheduler(self)
+        self.books = [eid for eid, (_, tradeable) in _ENCHANT_TABLE.items() if tradeable]
+        self.offers = self._roll()
+
+    def _roll(self):
+        eid = self.rng.choice(self.books)
+        level = self.rng.randint(1, _ENCHANT_TABLE[eid][0])
+        return [
+            _SimItem("emerald", 1, cost=("paper", 24)),
+            _SimItem("enchanted_book", 1, [(eid, level)], cost=("emerald", self.rng.randint(5, 64))),
+        ]
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def game_ticks(self):
+        return int(self.now / TICK_SECONDS)
+
+    def getblock(self, x, y, z):
+        if (x, y, z) == self.lectern:
+            return "minecraft:lectern[facing=north]"
+        return "minecraft:stone" if y < 64 else "minecraft:air"
+
+    def look_at(self, x, y, z):
+        self.aim = (x, y, z)
+
+    def select_slot(self, slot):
+        self.slot = slot
+
+    def press_use(self, down):
+        if not down or self.aim is None:
+            return
+        vx, vy, vz = self.VILLAGER
+        if _dist_sq(self.aim, (vx, vy + 1.0, vz)) < 0.5:
+            self.screen = "Villager" if self.lectern else None
+        elif self.slot == self.LECTERN_SLOT and self.lectern is None:
+            self.lectern = tuple(int(c) for c in self.aim)
+            if self.rng.random() < self.reroll_chance:
+                self.offers = self._roll()
+
+    def press_attack(self, down):
+        if down and self.aim is not None and self.lectern == tuple(int(c) for c in self.aim):
+            self.lectern = None
+
+    def screen_name(self):
+        return self.screen
+
+    def flush(self):
+        pass
+
+    def inventory(self):
+        return [
+            _SimStack(self.AXE_SLOT, "minecraft:netherite_axe"),
+            _SimStack(self.LECTERN_SLOT, "minecraft:lectern"),
+        ]
+
+    def execute(self, command):
+        pass
+
+    def entities(self, **kwargs):
+        return [_VillagerLike(self.VILLAGER, "villager", "minecraft:librarian")]
+
+    def villagers_fallback(self):
+        return []
+
+    def is_merchant_screen(self):
+        return self.screen is not None, "SimMerchantScreen" if self.screen else ""
+
+    def trade_offers(self):
+        if not self.screen:
+            return []
+        return [(i, track_handle(item), item.cost) for i, item in enumerate(self.offers)]
+
+    def trader_xp(self):
+        return 0
+
+    def enchants(self, item_handle):
+        return list(item_handle.enchants)
+
+    def close_screen(self):
+        self.screen = None
+        step_ok("Trade screen closed")
+        return True
+
+
+SOAK_WINDOW = 5
+SOAK_SAMPLE_EVERY = 50
+SOAK_MIN_HEAP_GROWTH = 64 * 1024
+
+
+class SoakMonitor:
+    def __init__(self, report, every=SOAK_SAMPLE_EVERY, max_cycles=0, window=SOAK_WINDOW):
+        self.report = report
+        self.every = max(1, every)
+        self.max_cycles = max_cycles
+        self.window = window
+        self.samples = []
+        self.cycle = 0
+        self.started = time.time()
+        tracemalloc.start(10)
+        self.baseline = tracemalloc.take_snapshot()
+
+    def on_cycle(self, cycle):
+        self.cycle = cycle
+        if cycle % self.every == 0:
+            self.sample(cycle)
+        return not self.max_cycles or cycle < self.max_cycles
+
+    def sample(self, cycle):
+        heap, _ = tracemalloc.get_traced_memory()
+        handles = live_handle_counts()
+        s = {
+            "cycle": cycle,
+            "heap": heap,
+            "threads": threading.active_count(),
+            "event_queues": open_event_queues,
+            "handles": handles,
+            "reroll_stalls": _STATUS.get("reroll_stalls", 0),
+        }
+        self.samples = (self.samples + [s])[-self.window:]
+        rate = cycle / max(time.time() - self.started, 1e-6)
+        self.report(
+            f"[soak] cycle {cycle} ({rate:.1f}/s): heap {heap / 1024:.0f} KiB, threads {s['threads']}, "
+            f"event queues {s['event_queues']}, handles {sum(handles.values())} "
+            f"({', '.join(f'{k} {v}' for k, v in sorted(handles.items())) or 'none'}), untracked {untracked_handles}, "
+            f"re-roll stalls {s['reroll_stalls']}"
+        )
+        update_status(soak=s)
+        self.check_growth()
+
+    def _growing(self, series):
+        return len(series) == self.window and all(b > a for a, b in zip(series, series[1:]))
+
+    def check_growth(self):
+        if len(self.samples) < self.window:
+            return
+        heap = [s["heap"] for s in self.samples]
+        if self._growing(heap) and heap[-1] - heap[0] >= SOAK_MIN_HEAP_GROWTH:
+            self.report(f"[soak] LEAK? heap grew {(heap[-1] - heap[0]) / 1024:.0f} KiB over {self.window} samples, top sites:")
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+            for stat in snapshot.compare_to(self.baseline, "lineno")[:5]:
+                if stat.size_diff > 0:
+                    frame = stat.traceback[0]
+                    self.report(f"[soak]   {frame.filename}:{frame.lineno} +{stat.size_diff / 1024:.1f} KiB ({stat.count_diff:+d} blocks)")
+        for key in ("threads", "event_queues"):
+            if self._growing([s[key] for s in self.samples]):
+                self.report(f"[soak] LEAK? {key} rising: {[s[key] for s in self.samples]}")
+        stages = set().union(*(s["handles"] for s in self.samples))
+        for stage in sorted(stages):
+            series = [s["handles"].get(stage, 0) for s in self.samples]
+            if self._growing(series):
+                self.report(f"[soak] LEAK? live handles from '{stage}' rising: {series}")
+
+    def stop(self):
+        tracemalloc.stop()
+
+
+def _parse_soak(args):
+    rest = []
+    backend = None
+    i = 0
+    while i < len(args):
+        if args[i] == "--soak":
+            backend = "live"
+            if i + 1 < len(args) and args[i + 1] in ("live", "sim"):
+                backend = args[i + 1]
+                i += 1
+        else:
+            rest.append(args[i])
+        i += 1
+    return backend, rest
+
+
+def run_soak_mode(mode, want, every, max_cycles, retry_budget):
+    echo(f"=== Soak mode ({mode}) ===" + (f" for {max_cycles} cycles" if max_cycles else " (Escape to stop)"))
+    if mode == "sim":
+        backend = SimBackend()
+        index = EnchantIndex(dict(_ENCHANT_TABLE), "bundled table")
+    else:
+        backend = LIVE
+        index = EnchantIndex.build()
+    targets = {}
+    if want:
+        eid, min_level = normalize_enchant(want)
+        eid, errors = resolve_target(index, eid, min_level)
+        if not eid:
+            for line in errors:
+                echo(line)
+            return
+        targets[eid] = min_level
+    monitor = SoakMonitor(echo, every=every, max_cycles=max_cycles)
+    watchdog = Watchdog(retry_budget, backend)
+    watchdog.start()
+    try:
+        run_cycle_loop(targets, watchdog, stop_on_match=False, on_cycle=monitor.on_cycle, backend=backend)
+    finally:
+        watchdog.stop()
+        release_inputs(backend)
+        set_stage("stopped")
+        if not monitor.samples or monitor.samples[-1]["cycle"] < monitor.cycle:
+            monitor.sample(monitor.cycle)
+        monitor.stop()
+
+
 if __name__ == "__main__":
     main()